@@ -1,7 +1,10 @@
-from datetime import date, datetime
+import os
+from datetime import MAXYEAR, MINYEAR, date
 from calendar import month_name
+from typing import Optional, Tuple
 
 from flask import Flask, render_template, request, redirect, url_for
+from flask_caching import Cache
 
 from db import SQLiteExpenseRepository
 from models import Expense
@@ -10,8 +13,15 @@ from compute import compute_balance_message
 
 app = Flask(__name__)
 
+# Rendered pages are cached per query string until the next write
+cache = Cache(app, config={"CACHE_TYPE": "SimpleCache"})
+
+# Compile templates now so the first request doesn't pay for it
+for template_name in ("base.html", "home.html", "view.html", "update.html"):
+    app.jinja_env.get_template(template_name)
+
 # Predefined shop names
-SHOP_CHOICES = [
+SHOP_CHOICES = (
     "Mizan",
     "Newon",
     "Madina",
@@ -19,49 +29,86 @@ SHOP_CHOICES = [
     "Costco",
     "Restaurents",
     "Walmart",
-    "Amazon"
-]
+    "Amazon",
+)
 
 # Month choices for dropdown: (1, "January"), (2, "February"), ...
-MONTH_CHOICES = [(i, month_name[i]) for i in range(1, 13)]
+MONTH_CHOICES = tuple((i, month_name[i]) for i in range(1, 13))
+
+
+def year_choices() -> Tuple[int, ...]:
+    """
+    Simple year choices around the current year (you can adjust this range
+    as you like). Computed per call so it rolls over at New Year.
+    """
+    y = date.today().year
+    return tuple(range(y - 2, y + 3))
+
+
+# Expenses shown per page
+PAGE_SIZE = 200
 
-# Simple year choices (you can adjust this range as you like)
-CURRENT_YEAR = datetime.now().year
-YEAR_CHOICES = list(range(CURRENT_YEAR - 2, CURRENT_YEAR + 3))
+# Highest page whose OFFSET still fits in SQLite's 64-bit INTEGER
+MAX_PAGE = (2**63 - 1) // PAGE_SIZE
 
 # Our repository instance
-repo = SQLiteExpenseRepository("expenses.db")
+repo = SQLiteExpenseRepository("expenses.db", shops=SHOP_CHOICES)
 
+# Database file stamp the cached pages were rendered against
+_cached_db_stamp = None
+
+
+@app.context_processor
+def inject_choices():
+    """
+    Dropdown choices shared by every template.
+    """
+    return {"shops": SHOP_CHOICES, "months": MONTH_CHOICES, "years": year_choices()}
 
-@app.route("/", methods=["GET"])
-def index():
-    # Read month/year filters from query parameters (?month=5&year=2025)
-    month_str = request.args.get("month", "").strip()
-    year_str = request.args.get("year", "").strip()
 
-    month = int(month_str) if month_str.isdigit() else None
-    year = int(year_str) if year_str.isdigit() else None
+def _db_stamp():
+    """
+    (mtime, size) of the database and its WAL file; any commit, from this
+    process or another, changes it.
+    """
+    stamp = []
+    for path in (repo.db_path, repo.db_path + "-wal"):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            stamp.append(None)
+        else:
+            stamp.append((st.st_mtime_ns, st.st_size))
+    return tuple(stamp)
+
+
+@app.before_request
+def invalidate_stale_pages():
+    """
+    Drop cached pages once the database has changed on disk, so writes made
+    outside /update (scripts, other processes) show up too.
+    """
+    global _cached_db_stamp
+    stamp = _db_stamp()
+    if stamp != _cached_db_stamp:
+        cache.clear()
+        _cached_db_stamp = stamp
 
-    # Get filtered expenses and totals
-    expenses = repo.list_all(month=month, year=year)
-    totals = repo.get_totals(month=month, year=year)
 
-    balance_message = compute_balance_message(totals)
+def _parse_bounded(value: str, lo: int, hi: int) -> Optional[int]:
+    """
+    Parse a query-string integer, or None if it's missing, not a number or
+    outside [lo, hi].
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        return None
+    return number if lo <= number <= hi else None
 
-    return render_template(
-        "home.html",
-        expenses=expenses,
-        totals=totals,
-        shops=SHOP_CHOICES,
-        months=MONTH_CHOICES,
-        years=YEAR_CHOICES,
-        selected_month=month,
-        selected_year=year,
-        balance_message=balance_message,
-    )
 
-@app.route("/")
-def home():
+@app.route("/", methods=["GET"])
+def index():
     """
     Home page: user selects View or Update.
     """
@@ -69,37 +116,44 @@ def home():
 
 
 @app.route("/view", methods=["GET"])
+@cache.cached(timeout=300, query_string=True)
 def view_expenses():
-    month_str = request.args.get("month", "").strip()
-    year_str = request.args.get("year", "").strip()
-    day_str = request.args.get("day", "").strip()
-
-    month = int(month_str) if month_str.isdigit() else None
-    year = int(year_str) if year_str.isdigit() else None
-    day = int(day_str) if day_str.isdigit() else None
+    month = _parse_bounded(request.args.get("month", ""), 1, 12)
+    year = _parse_bounded(request.args.get("year", ""), MINYEAR, MAXYEAR - 1)
+    day = _parse_bounded(request.args.get("day", ""), 1, 31)
+    page = _parse_bounded(request.args.get("page", ""), 1, MAX_PAGE) or 1
 
     show_results = month is not None  # 🔴 only show results if month is chosen
 
     if show_results:
-        expenses = repo.list_all(month=month, year=year, day=day)
-        totals = repo.get_totals(month=month, year=year, day=day)
-        balance_message = compute_balance_message(totals)
+        expenses, balance = repo.list_with_balance(
+            month=month,
+            year=year,
+            day=day,
+            # One extra row tells us whether there is a next page
+            limit=PAGE_SIZE + 1,
+            offset=(page - 1) * PAGE_SIZE,
+        )
+        has_next = len(expenses) > PAGE_SIZE
+        expenses = expenses[:PAGE_SIZE]
+        balance_message = compute_balance_message(balance)
     else:
         expenses = []
-        totals = {}
+        balance = (0.0, 0.0)
+        has_next = False
         balance_message = "Please select a month to see expenses."
 
     return render_template(
         "view.html",
         expenses=expenses,
-        totals=totals,
-        months=MONTH_CHOICES,
-        years=YEAR_CHOICES,
+        balance=balance,
         selected_month=month,
         selected_year=year,
         selected_day=day,
         balance_message=balance_message,
         show_results=show_results,   # 👈 pass this flag to template
+        page=page,
+        has_next=has_next,
     )
 
 
@@ -126,15 +180,13 @@ def update_expense():
         )
 
         repo.add(new_expense)
+        cache.clear()
 
         # After update, redirect back to home or view
-        return redirect(url_for("home"))
+        return redirect(url_for("index"))
 
     # GET: show the form
-    return render_template(
-        "update.html",
-        shops=SHOP_CHOICES,
-    )
+    return render_template("update.html")
 
 
 if __name__ == "__main__":
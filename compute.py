@@ -1,24 +1,22 @@
+from typing import Tuple
 
-def compute_balance_message(totals: dict) -> str:
+
+def compute_balance_message(balance: Tuple[float, float]) -> str:
     """
-    Compute who owes whom based on totals for the current view.
+    Compute who owes whom from (Shakib's total, Junit's total) for the
+    current view.
     """
-    shakib_total = float(totals.get("Shakib", 0.0))
-    junit_total = float(totals.get("Junit", 0.0))
+    shakib_total, junit_total = balance
 
-    total_spent = shakib_total + junit_total
-    if total_spent == 0:
+    if not shakib_total and not junit_total:
         return "No expenses recorded for this period."
 
-    equal_share = total_spent / 2.0
-    diff = shakib_total - equal_share
+    half = (shakib_total + junit_total) * 0.5
+    diff = shakib_total - half
 
     if abs(diff) < 1e-6:
         return "Both Shakib and Junit have spent equally. No one owes anything."
 
-    if diff > 0:
-        # Shakib paid more than his share
-        return f"Junit owes Shakib {diff:.2f}$."
-    else:
-        # Junit paid more
-        return f"Shakib owes Junit {(-diff):.2f}$."
\ No newline at end of file
+    # Positive diff: Shakib paid more than his share; negative: Junit did
+    owes = ("Junit owes Shakib", "Shakib owes Junit")[diff < 0]
+    return f"{owes} {abs(diff):.2f}$."
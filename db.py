@@ -1,11 +1,51 @@
 # db.py
+import calendar
 import sqlite3
+import threading
+from itertools import product
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional
-from datetime import date
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+    Union,
+)
+from datetime import date, timedelta
 
 from models import Expense
 
+# Dates are stored as proleptic Gregorian ordinals (date.toordinal()).
+# Adding this offset turns an ordinal into a Julian day number, which
+# SQLite's date()/strftime() accept directly.
+JULIAN_DAY_OFFSET = 1721424.5
+
+# The two people sharing expenses
+SPENDERS = ("Shakib", "Junit")
+
+# spender/shop are ids into the spenders/shops lookup tables
+EXPENSES_TABLE_SQL = """
+    CREATE TABLE {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        spender INTEGER NOT NULL REFERENCES spenders(id),
+        date INTEGER NOT NULL,  -- date.toordinal()
+        shop INTEGER NOT NULL REFERENCES shops(id),
+        amount REAL NOT NULL
+    )
+"""
+
+
+class ExpenseRow(Protocol):
+    """
+    A display row from list_all, e.g. sqlite3.Row: row["spender"] etc.
+    """
+
+    def __getitem__(self, key: str) -> Any: ...
+
 
 class AbstractExpenseRepository(ABC):
     """
@@ -16,15 +56,27 @@ class AbstractExpenseRepository(ABC):
     def add(self, expense: Expense) -> None:
         raise NotImplementedError
 
+    @abstractmethod
+    def add_many(self, expenses: Iterable[Expense]) -> None:
+        """
+        Add several expenses in a single transaction.
+        """
+        raise NotImplementedError
+
     @abstractmethod
     def list_all(
         self,
         month: Optional[int] = None,
         year: Optional[int] = None,
         day: Optional[int] = None,
-    ) -> List[Expense]:
+        limit: int = 200,
+        offset: int = 0,
+    ) -> Sequence[ExpenseRow]:
         """
-        Return all expenses, optionally filtered by month/year/day.
+        Return one page of expenses, optionally filtered by month/year/day.
+
+        Rows are indexed by key: id, spender, date (ISO string), shop and
+        amount, ready for display.
         """
         raise NotImplementedError
 
@@ -40,119 +92,389 @@ class AbstractExpenseRepository(ABC):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    def get_balance(
+        self,
+        month: Optional[int] = None,
+        year: Optional[int] = None,
+        day: Optional[int] = None,
+    ) -> Tuple[float, float]:
+        """
+        Return (Shakib's total, Junit's total) for the given period.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_with_balance(
+        self,
+        month: Optional[int] = None,
+        year: Optional[int] = None,
+        day: Optional[int] = None,
+        limit: int = 200,
+        offset: int = 0,
+    ) -> Tuple[Sequence[ExpenseRow], Tuple[float, float]]:
+        """
+        Return (list_all(...), get_balance(...)) for the same filter.
+
+        The balance always covers the whole period, not just the page.
+        """
+        raise NotImplementedError
+
 
 class SQLiteExpenseRepository(AbstractExpenseRepository):
     """
     Concrete implementation of AbstractExpenseRepository using SQLite.
 
-    Uses a single 'expenses' table, but it’s indexed on date so
-    filtering by month/year/day scales well as data grows.
+    Uses an 'expenses' table indexed on date so filtering by
+    month/year/day scales well as data grows. Spender and shop names live
+    in small 'spenders' and 'shops' lookup tables; expenses store their
+    integer ids. Both are seeded at startup (shops from the given names),
+    and any other shop is added the first time it is used.
     """
 
-    def __init__(self, db_path: str = "expenses.db") -> None:
+    def __init__(
+        self, db_path: str = "expenses.db", shops: Iterable[str] = ()
+    ) -> None:
         self.db_path = db_path
+        self._seed_shops = tuple(shops)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._list_queries = self._build_queries(
+            "SELECT expenses.id AS id, spenders.name AS spender,"
+            f" date(expenses.date + {JULIAN_DAY_OFFSET}) AS date,"
+            " shops.name AS shop, expenses.amount AS amount"
+            " FROM expenses"
+            " JOIN spenders ON spenders.id = expenses.spender"
+            " JOIN shops ON shops.id = expenses.shop",
+            " ORDER BY expenses.date ASC, expenses.id DESC LIMIT ? OFFSET ?",
+        )
+        self._balance_queries = self._build_queries(
+            "SELECT TOTAL(CASE WHEN spender = ? THEN amount END),"
+            " TOTAL(CASE WHEN spender = ? THEN amount END) FROM expenses",
+            "",
+        )
         self._create_table()
+        self._migrate_legacy_schema()
         self._create_indexes()
+        self._apply_pragmas()
+        with self._lock:
+            self._load_ids()
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Lazily open the shared connection, reused across requests.
 
-    def _get_connection(self) -> sqlite3.Connection:
-        return sqlite3.connect(self.db_path)
+        Callers must hold self._lock while using it.
+        """
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+        return self._conn
 
     def _create_table(self) -> None:
-        with self._get_connection() as conn:
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS spenders (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE
+                )
+                """
+            )
             conn.execute(
                 """
-                CREATE TABLE IF NOT EXISTS expenses (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    spender TEXT NOT NULL,
-                    date TEXT NOT NULL,  -- ISO: YYYY-MM-DD
-                    shop TEXT NOT NULL,
-                    amount REAL NOT NULL
+                CREATE TABLE IF NOT EXISTS shops (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE
                 )
                 """
             )
+            conn.execute(EXPENSES_TABLE_SQL.format(name="IF NOT EXISTS expenses"))
+            conn.executemany(
+                "INSERT OR IGNORE INTO spenders (name) VALUES (?)",
+                [(name,) for name in SPENDERS],
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO shops (name) VALUES (?)",
+                [(name,) for name in self._seed_shops],
+            )
             conn.commit()
 
+    def _migrate_legacy_schema(self) -> None:
+        """
+        Rebuild databases from older layouts: ISO 'YYYY-MM-DD' TEXT dates
+        become ordinals, and spender/shop names become lookup-table ids.
+        The old indexes go with the old table and are recreated by
+        _create_indexes.
+        """
+        with self._lock:
+            conn = self._connection()
+            columns = {
+                row["name"]: row["type"]
+                for row in conn.execute("PRAGMA table_info(expenses)")
+            }
+            if "TEXT" not in (columns["date"], columns["spender"], columns["shop"]):
+                return
+
+            date_expr = "date"
+            if columns["date"] == "TEXT":
+                date_expr = f"CAST(julianday(date) - {JULIAN_DAY_OFFSET} AS INTEGER)"
+
+            lookups = ""
+            spender_expr, shop_expr = "spender", "shop"
+            if columns["spender"] == "TEXT":
+                lookups += """
+                INSERT OR IGNORE INTO spenders (name)
+                SELECT DISTINCT spender FROM expenses_old;
+                """
+                spender_expr = (
+                    "(SELECT id FROM spenders WHERE name = expenses_old.spender)"
+                )
+            if columns["shop"] == "TEXT":
+                lookups += """
+                INSERT OR IGNORE INTO shops (name)
+                SELECT DISTINCT shop FROM expenses_old;
+                """
+                shop_expr = "(SELECT id FROM shops WHERE name = expenses_old.shop)"
+
+            conn.executescript(
+                f"""
+                BEGIN;
+                ALTER TABLE expenses RENAME TO expenses_old;
+                {EXPENSES_TABLE_SQL.format(name="expenses")};
+                {lookups}
+                INSERT INTO expenses (id, spender, date, shop, amount)
+                SELECT id, {spender_expr}, {date_expr}, {shop_expr}, amount
+                FROM expenses_old;
+                DROP TABLE expenses_old;
+                COMMIT;
+                """
+            )
+
     def _create_indexes(self) -> None:
         """
-        Index on date and spender to scale lookups as data grows.
+        Index on date, plus a (date, spender, amount) covering index so
+        get_balance can aggregate a date range from index pages alone.
         """
-        with self._get_connection() as conn:
+        with self._lock:
+            conn = self._connection()
             conn.execute(
                 "CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date)"
             )
             conn.execute(
-                "CREATE INDEX IF NOT EXISTS idx_expenses_spender ON expenses(spender)"
+                """
+                CREATE INDEX IF NOT EXISTS idx_expenses_date_spender_amount
+                ON expenses(date, spender, amount)
+                """
             )
+            # Only two spenders, so a spender index never pays for itself.
+            conn.execute("DROP INDEX IF EXISTS idx_expenses_spender")
             conn.commit()
 
+    def _apply_pragmas(self) -> None:
+        """
+        WAL so readers don't block the writer, plus relaxed fsync and a
+        larger in-memory cache. Foreign keys are enforced so expenses can
+        only point at existing spenders/shops.
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA cache_size=-64000")
+            conn.execute("PRAGMA mmap_size=268435456")
+            conn.execute("PRAGMA foreign_keys=ON")
+
+    def _load_ids(self) -> None:
+        """
+        (Re)load the name -> id caches. Callers must hold self._lock.
+        """
+        conn = self._connection()
+        self._spender_ids: Dict[str, int] = dict(
+            conn.execute("SELECT name, id FROM spenders").fetchall()
+        )
+        self._shop_ids: Dict[str, int] = dict(
+            conn.execute("SELECT name, id FROM shops").fetchall()
+        )
+
+    def _lookup_id(
+        self,
+        conn: sqlite3.Connection,
+        table: str,
+        ids: Dict[str, int],
+        name: str,
+    ) -> int:
+        """
+        Id for name in a lookup table, inserting it the first time it is
+        seen (e.g. a new shop). Callers must hold self._lock.
+        """
+        row_id = ids.get(name)
+        if row_id is None:
+            conn.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,))
+            (row_id,) = conn.execute(
+                f"SELECT id FROM {table} WHERE name = ?", (name,)
+            ).fetchone()
+            ids[name] = row_id
+        return row_id
+
     def add(self, expense: Expense) -> None:
-        with self._get_connection() as conn:
-            conn.execute(
-                """
-                INSERT INTO expenses (spender, date, shop, amount)
-                VALUES (?, ?, ?, ?)
-                """,
-                (expense.spender, expense.date.isoformat(), expense.shop, expense.amount),
-            )
-            conn.commit()
+        self.add_many([expense])
 
+    def add_many(self, expenses: Iterable[Expense]) -> None:
+        """
+        One executemany and one commit (so one fsync) for the whole batch.
+        """
+        with self._lock:
+            conn = self._connection()
+            try:
+                rows = [
+                    (
+                        self._lookup_id(conn, "spenders", self._spender_ids, e.spender),
+                        e.date.toordinal(),
+                        self._lookup_id(conn, "shops", self._shop_ids, e.shop),
+                        e.amount,
+                    )
+                    for e in expenses
+                ]
+                conn.executemany(
+                    """
+                    INSERT INTO expenses (spender, date, shop, amount)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    rows,
+                )
+                conn.commit()
+            except Exception:
+                # Any names inserted above were rolled back too
+                conn.rollback()
+                self._load_ids()
+                raise
+
+    @staticmethod
+    def _date_range(
+        month: Optional[int],
+        year: int,
+        day: Optional[int],
+    ) -> Tuple[date, date]:
+        """
+        Return the half-open [start, end) date range covered by year,
+        year+month or year+month+day. Raises ValueError for impossible dates.
+        """
+        if month is None:
+            return date(year, 1, 1), date(year + 1, 1, 1)
+
+        if day is None:
+            start = date(year, month, 1)
+            _, days_in_month = calendar.monthrange(year, month)
+            return start, start + timedelta(days=days_in_month)
+
+        start = date(year, month, day)
+        return start, start + timedelta(days=1)
+
+    @staticmethod
+    def _is_range(has_year: bool, has_month: bool, has_day: bool) -> bool:
+        """
+        Year, year+month and year+month+day are a single contiguous range.
+        """
+        return has_year and (has_month or not has_day)
+
+    @classmethod
     def _build_where_clause(
+        cls,
+        has_year: bool,
+        has_month: bool,
+        has_day: bool,
+    ) -> str:
+        """
+        Build the WHERE clause for a filter shape.
+
+        Contiguous shapes become a plain integer `date >= ? AND date < ?`
+        range so idx_expenses_date can be used. Month/day filters across all
+        years can't be expressed as one range, so those still match on
+        strftime().
+        """
+        if cls._is_range(has_year, has_month, has_day):
+            return " WHERE expenses.date >= ? AND expenses.date < ?"
+
+        julian_day = f"expenses.date + {JULIAN_DAY_OFFSET}"
+        conditions = []
+        if has_year:
+            conditions.append(f"strftime('%Y', {julian_day}) = ?")
+        if has_month:
+            conditions.append(f"strftime('%m', {julian_day}) = ?")
+        if has_day:
+            conditions.append(f"strftime('%d', {julian_day}) = ?")
+
+        where_clause = ""
+        if conditions:
+            where_clause = " WHERE " + " AND ".join(conditions)
+
+        return where_clause
+
+    def _build_where_params(
         self,
         month: Optional[int],
         year: Optional[int],
         day: Optional[int],
-    ):
-        conditions = []
-        params: List[str] = []
+    ) -> List[Union[int, str]]:
+        """
+        Parameters matching _build_where_clause for the same filters.
+        """
+        if year is not None and self._is_range(
+            True, month is not None, day is not None
+        ):
+            try:
+                start, end = self._date_range(month, year, day)
+            except ValueError:
+                # e.g. February 30th: an empty range matches nothing
+                return [0, 0]
+            return [start.toordinal(), end.toordinal()]
 
+        params: List[Union[int, str]] = []
         if year is not None:
-            conditions.append("strftime('%Y', date) = ?")
             params.append(str(year))
-
         if month is not None:
-            conditions.append("strftime('%m', date) = ?")
             params.append(f"{month:02d}")
-
         if day is not None:
-            conditions.append("strftime('%d', date) = ?")
             params.append(f"{day:02d}")
+        return params
 
-        where_clause = ""
-        if conditions:
-            where_clause = " WHERE " + " AND ".join(conditions)
-
-        return where_clause, params
+    @classmethod
+    def _build_queries(
+        cls, base_query: str, suffix: str
+    ) -> Dict[Tuple[bool, bool, bool], str]:
+        """
+        Precompute the query text for all 8 filter shapes, keyed by
+        (has_year, has_month, has_day). Reusing the exact same string each
+        call lets sqlite3's statement cache skip re-parsing.
+        """
+        return {
+            (has_year, has_month, has_day): base_query
+            + cls._build_where_clause(has_year, has_month, has_day)
+            + suffix
+            for has_year, has_month, has_day in product((False, True), repeat=3)
+        }
 
     def list_all(
         self,
         month: Optional[int] = None,
         year: Optional[int] = None,
         day: Optional[int] = None,
-    ) -> List[Expense]:
-        base_query = """
-            SELECT id, spender, date, shop, amount
-            FROM expenses
-        """
-
-        where_clause, params = self._build_where_clause(month, year, day)
-        query = base_query + where_clause + " ORDER BY date ASC, id DESC"
-
-        with self._get_connection() as conn:
-            cursor = conn.execute(query, params)
-            rows = cursor.fetchall()
-
-        expenses: List[Expense] = []
-        for row_id, spender, date_str, shop, amount in rows:
-            expenses.append(
-                Expense(
-                    id=row_id,
-                    spender=spender,
-                    date=date.fromisoformat(date_str),
-                    shop=shop,
-                    amount=amount,
-                )
-            )
-        return expenses
+        limit: int = 200,
+        offset: int = 0,
+    ) -> List[sqlite3.Row]:
+        query = self._list_queries[
+            (year is not None, month is not None, day is not None)
+        ]
+        params = [*self._build_where_params(month, year, day), limit, offset]
+
+        # Rows go straight to the templates, which only print the date,
+        # so SQLite renders it as ISO text and no Expense is built per row.
+        with self._lock:
+            cursor = self._connection().execute(query, params)
+            return cursor.fetchall()
 
     def get_totals(
         self,
@@ -160,16 +482,58 @@ class SQLiteExpenseRepository(AbstractExpenseRepository):
         year: Optional[int] = None,
         day: Optional[int] = None,
     ) -> Dict[str, float]:
-        base_query = """
-            SELECT spender, SUM(amount)
-            FROM expenses
+        return dict(zip(SPENDERS, self.get_balance(month=month, year=year, day=day)))
+
+    def get_balance(
+        self,
+        month: Optional[int] = None,
+        year: Optional[int] = None,
+        day: Optional[int] = None,
+    ) -> Tuple[float, float]:
         """
+        Both totals in a single pass with conditional sums, no GROUP BY.
+        TOTAL() yields 0.0 rather than NULL when nothing matches.
+        """
+        query = self._balance_queries[
+            (year is not None, month is not None, day is not None)
+        ]
+        params = [
+            *(self._spender_ids[name] for name in SPENDERS),
+            *self._build_where_params(month, year, day),
+        ]
+
+        with self._lock:
+            shakib_total, junit_total = self._connection().execute(
+                query, params
+            ).fetchone()
 
-        where_clause, params = self._build_where_clause(month, year, day)
-        query = base_query + where_clause + " GROUP BY spender"
+        return shakib_total, junit_total
+
+    def list_with_balance(
+        self,
+        month: Optional[int] = None,
+        year: Optional[int] = None,
+        day: Optional[int] = None,
+        limit: int = 200,
+        offset: int = 0,
+    ) -> Tuple[List[sqlite3.Row], Tuple[float, float]]:
+        """
+        When the whole period fits on the first page, the balance is summed
+        in Python from the rows already fetched, saving a query.
+        """
+        expenses = self.list_all(
+            month=month, year=year, day=day, limit=limit, offset=offset
+        )
+        # Fewer than limit rows means the whole period was fetched (this
+        # holds for callers that over-fetch by one to detect a next page)
+        if offset or len(expenses) >= limit:
+            return expenses, self.get_balance(month=month, year=year, day=day)
 
-        with self._get_connection() as conn:
-            cursor = conn.execute(query, params)
-            rows = cursor.fetchall()
+        # Same as get_balance: only SPENDERS count
+        totals: Dict[str, float] = dict.fromkeys(SPENDERS, 0.0)
+        for expense in expenses:
+            if expense["spender"] in totals:
+                totals[expense["spender"]] += expense["amount"]
 
-        return {spender: (total or 0.0) for spender, total in rows}
+        shakib_name, junit_name = SPENDERS
+        return expenses, (totals[shakib_name], totals[junit_name])
@@ -2,7 +2,7 @@ from dataclasses import dataclass
 from datetime import date
 from typing import Optional
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Expense:
     """
     Represents a single expense entry.